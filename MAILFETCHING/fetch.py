@@ -5,20 +5,22 @@ import pickle
 import base64
 import datetime
 from base64 import urlsafe_b64decode
-from typing import Optional, List, Tuple
-
-from bs4 import BeautifulSoup
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import Flow
-from pymongo import MongoClient
+from typing import Optional, List, Tuple, TYPE_CHECKING
+
 from dotenv import load_dotenv
 
+import metrics
+import database
+import email_body
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+# bs4, the Google API client and the OAuth libraries are slow to import, so they
+# are imported inside the functions that use them rather than at module load.
+
 load_dotenv()
 
-MONGO_URI = os.getenv("mongo_uri")
 CLIENT_SECRETS_FILE = os.getenv("CLIENT_SECRETS_FILE", "credentials.json")
 REDIRECT_URI = os.getenv("REDIRECT_URI", "http://localhost:5000/oauth2callback")
 
@@ -27,24 +29,25 @@ SCOPES = [
     'https://www.googleapis.com/auth/calendar'
 ]
 
-# Mongo
-_client = MongoClient(MONGO_URI)
-db = _client['Emails']
-tokens_collection = _client['gmail_auth']['tokens']
-
 # ---------------- Utilities ----------------
+def build(*args, **kwargs):
+    """googleapiclient.discovery.build, imported on first use."""
+    from googleapiclient.discovery import build as discovery_build
+    return discovery_build(*args, **kwargs)
+
 def sanitize_email_for_collection(email: str) -> str:
     return email.replace("@", "at").replace(".", "dot")
 
-def creds_to_b64(creds: Credentials) -> str:
+def creds_to_b64(creds: "Credentials") -> str:
     return base64.b64encode(pickle.dumps(creds)).decode()
 
-def creds_from_b64(b64: str) -> Credentials:
+def creds_from_b64(b64: str) -> "Credentials":
     return pickle.loads(base64.b64decode(b64.encode()))
 
 # ---------------- OAuth helpers ----------------
 def authenticate_user() -> Optional[str]:
     try:
+        from google_auth_oauthlib.flow import Flow
         flow = Flow.from_client_secrets_file(CLIENT_SECRETS_FILE, scopes=SCOPES, redirect_uri=REDIRECT_URI)
         auth_url, _ = flow.authorization_url(access_type="offline", include_granted_scopes="true", prompt="consent")
         return auth_url
@@ -52,11 +55,12 @@ def authenticate_user() -> Optional[str]:
         print(f"[ERROR] authenticate_user: {e}")
         return None
 
-def exchange_code_for_user(code: str) -> Tuple[Optional[str], Optional[Credentials]]:
+def exchange_code_for_user(code: str) -> Tuple[Optional[str], Optional["Credentials"]]:
     try:
+        from google_auth_oauthlib.flow import Flow
         flow = Flow.from_client_secrets_file(CLIENT_SECRETS_FILE, scopes=SCOPES, redirect_uri=REDIRECT_URI)
         flow.fetch_token(code=code)
-        creds: Credentials = flow.credentials
+        creds = flow.credentials
 
         gmail_service = build('gmail', 'v1', credentials=creds)
         profile = gmail_service.users().getProfile(userId='me').execute()
@@ -71,9 +75,9 @@ def exchange_code_for_user(code: str) -> Tuple[Optional[str], Optional[Credentia
         return None, None
 
 # ---------------- Token storage helpers ----------------
-def save_token_to_db(email: str, user_id: str, creds: Credentials) -> None:
+def save_token_to_db(email: str, user_id: str, creds: "Credentials") -> None:
     try:
-        tokens_collection.update_one(
+        database.get_tokens_collection().update_one(
             {"user_id": user_id},
             {"$set": {
                 "user_id": user_id,
@@ -86,9 +90,9 @@ def save_token_to_db(email: str, user_id: str, creds: Credentials) -> None:
     except Exception as e:
         print(f"[ERROR] save_token_to_db: {e}")
 
-def load_token_from_db_by_userid(user_id: str) -> Tuple[Optional[Credentials], Optional[str]]:
+def load_token_from_db_by_userid(user_id: str) -> Tuple[Optional["Credentials"], Optional[str]]:
     try:
-        doc = tokens_collection.find_one({"user_id": user_id})
+        doc = database.get_tokens_collection().find_one({"user_id": user_id})
         if not doc or "creds_b64" not in doc:
             return None, None
         creds = creds_from_b64(doc["creds_b64"])
@@ -99,7 +103,12 @@ def load_token_from_db_by_userid(user_id: str) -> Tuple[Optional[Credentials], O
 
 # ---------------- Cleaning helpers ----------------
 def clean_full_text(raw_html: str) -> str:
+    with metrics.timed("html_clean", chars=len(raw_html or "")):
+        return _clean_full_text(raw_html)
+
+def _clean_full_text(raw_html: str) -> str:
     try:
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(raw_html, 'html.parser')
         for tag in soup(['script', 'style', 'img', 'a']):
             tag.decompose()
@@ -107,7 +116,10 @@ def clean_full_text(raw_html: str) -> str:
         text = re.sub(r'https?://\S+', '', text)
         text = re.sub(r'\s+', ' ', text)
         return text.strip()
-    except Exception:
+    except Exception as e:
+        # swallowed here, so the html_clean timer in clean_full_text never sees it
+        metrics.inc("mailmind_stage_errors_total", stage="html_clean")
+        metrics.log_event("html_clean", force=True, outcome="error", error=str(e))
         return "(Clean failed)"
 
 def extract_plain_text(payload: dict) -> str:
@@ -141,13 +153,14 @@ def extract_plain_text(payload: dict) -> str:
         return "(Extraction failed)"
 
 # ---------------- Credential maintenance ----------------
-def ensure_creds_valid(creds: Credentials) -> Credentials:
+def ensure_creds_valid(creds: "Credentials") -> "Credentials":
     """
     Refresh creds if expired and refresh_token available.
     Returns the (possibly refreshed) creds.
     """
     try:
         if creds and creds.expired and creds.refresh_token:
+            from google.auth.transport.requests import Request
             request = Request()
             creds.refresh(request)
     except Exception as e:
@@ -156,7 +169,7 @@ def ensure_creds_valid(creds: Credentials) -> Credentials:
     return creds
 
 # ---------------- Core: fetch only unread, newest-first ----------------
-def get_unread_emails(creds: Credentials, user_id: str, limit: int = 10, page_token: str = None, verbose: bool = True):
+def get_unread_emails(creds: "Credentials", user_id: str, limit: int = 10, page_token: str = None, verbose: bool = True):
     """
     Fetch a batch of unread emails for the user.
     Returns dict: { 'inserted': [...], 'next_page_token': '...' }
@@ -180,12 +193,13 @@ def get_unread_emails(creds: Credentials, user_id: str, limit: int = 10, page_to
 
     try:
         # fetch a single batch (limit emails)
-        resp = service.users().messages().list(
-            userId='me',
-            q=q,
-            maxResults=limit,
-            pageToken=page_token
-        ).execute()
+        with metrics.timed("gmail_list", user_id=user_id):
+            resp = service.users().messages().list(
+                userId='me',
+                q=q,
+                maxResults=limit,
+                pageToken=page_token
+            ).execute()
 
         msg_refs = resp.get('messages', [])
         next_page_token = resp.get('nextPageToken')
@@ -200,7 +214,8 @@ def get_unread_emails(creds: Credentials, user_id: str, limit: int = 10, page_to
         for mr in msg_refs:
             mid = mr.get('id')
             try:
-                full = service.users().messages().get(userId='me', id=mid, format='full').execute()
+                with metrics.timed("gmail_get", user_id=user_id):
+                    full = service.users().messages().get(userId='me', id=mid, format='full').execute()
                 messages_full.append(full)
             except Exception as e:
                 if verbose:
@@ -209,30 +224,35 @@ def get_unread_emails(creds: Credentials, user_id: str, limit: int = 10, page_to
         # Sort newest-first
         messages_full.sort(key=lambda m: int(m.get('internalDate', 0)), reverse=True)
 
-        col = db[user_id]
+        col = database.get_db()[user_id]
         for msg_data in messages_full:
             msg_id = msg_data.get('id')
             if not msg_id:
                 continue
 
             # dedupe
-            if col.find_one({"msg_id": msg_id}, {"_id": 1}):
+            with metrics.timed("mongo_read", user_id=user_id):
+                seen = col.find_one({"msg_id": msg_id}, {"_id": 1})
+            if seen:
                 continue
 
             headers = msg_data.get('payload', {}).get('headers', [])
             subject = next((h.get('value') for h in headers if h.get('name', '').lower() == 'subject'), "(No Subject)")
             body = extract_plain_text(msg_data.get('payload'))
 
+            # full body is stored compressed; list views read only `preview`
             doc = {
                 "subject": subject,
-                "body": body,
+                **email_body.pack_body(body),
                 "msg_id": msg_id,
                 "fetched_at": datetime.datetime.utcnow(),
                 "processed": False
             }
 
             try:
-                col.insert_one(doc)
+                with metrics.timed("mongo_write", user_id=user_id):
+                    col.insert_one(doc)
+                metrics.inc("mailmind_emails_fetched_total")
                 inserted.append({"msg_id": msg_id, "subject": subject[:120]})
             except Exception as e:
                 print(f"[ERROR] insert failed for msg {msg_id}: {e}")
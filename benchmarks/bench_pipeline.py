@@ -0,0 +1,569 @@
+# bench_pipeline.py
+"""
+Offline benchmark for the ingest -> classify -> enrich pipeline.
+
+Runs main.process_emails_for_user against:
+- a fake Gmail service serving synthetic messages built from processed.csv
+  (plain, HTML, multipart/alternative, nested multipart/mixed, large HTML)
+- a stub Gemini model with configurable latency
+- a fake Calendar service
+- an in-memory Mongo (or a local Mongo via --mongo-uri)
+
+Usage (from the repo root):
+    python -m benchmarks.bench_pipeline --users 4 --mails 50
+    python -m benchmarks.bench_pipeline --baseline benchmarks/results/old.json
+"""
+import os
+import re
+import sys
+import copy
+import json
+import time
+import base64
+import pickle
+import random
+import argparse
+import datetime
+import platform
+import subprocess
+import tracemalloc
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_PATH = os.path.join(REPO_ROOT, "datapreprocessing", "processeddatset", "processed.csv")
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# stages timed inside the app by metrics.timed() that have no function boundary to wrap
+METRICS_STAGES = ("creds_load", "mongo_read", "mongo_write")
+
+
+# ---------------- Stage timing ----------------
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def wrap(self, owner, attr, stage):
+        """Replace owner.attr with a version that records its duration under `stage`."""
+        original = getattr(owner, attr)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(owner, attr, timed)
+        return original
+
+    def summary(self):
+        return {stage: summarize_samples(values) for stage, values in sorted(self.samples.items())}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(rank)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (rank - lo)
+
+
+def summarize_samples(values):
+    ordered = sorted(values)
+    ms = lambda s: round(s * 1000.0, 3)
+    return {
+        "count": len(ordered),
+        "total_ms": ms(sum(ordered)),
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p90_ms": ms(percentile(ordered, 90)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+    }
+
+
+# ---------------- In-memory Mongo ----------------
+def _matches(doc, query):
+    for key, cond in (query or {}).items():
+        value = doc.get(key)
+        if isinstance(cond, dict) and "$ne" in cond:
+            if value == cond["$ne"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    keys = [k for k, v in projection.items() if v]
+    out = {k: copy.deepcopy(doc[k]) for k in keys if k in doc}
+    if projection.get("_id", 1):
+        out["_id"] = doc["_id"]
+    return out
+
+
+class MemoryCollection:
+    """Just enough of pymongo's Collection API for the pipeline code paths."""
+
+    def __init__(self):
+        self._docs = []
+
+    def insert_one(self, doc):
+        from bson import ObjectId
+        doc.setdefault("_id", ObjectId())
+        self._docs.append(copy.deepcopy(doc))
+
+    def find_one(self, query=None, projection=None):
+        for doc in self._docs:
+            if _matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    def find(self, query=None, projection=None):
+        return [_project(doc, projection) for doc in self._docs if _matches(doc, query)]
+
+    def update_one(self, query, update):
+        for doc in self._docs:
+            if _matches(doc, query):
+                doc.update(copy.deepcopy(update.get("$set", {})))
+                return
+
+    def count_documents(self, query):
+        return sum(1 for doc in self._docs if _matches(doc, query))
+
+
+class MemoryDatabase(defaultdict):
+    def __init__(self):
+        super().__init__(MemoryCollection)
+
+
+class MemoryClient(defaultdict):
+    def __init__(self):
+        super().__init__(MemoryDatabase)
+
+
+# ---------------- Synthetic mail ----------------
+def _b64(text):
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode()
+
+
+def _html_body(subject, body, pad_kb=0):
+    paragraphs = "".join(f"<p>{line}</p>" for line in body.splitlines() if line.strip())
+    padding = ""
+    if pad_kb:
+        row = ("<tr><td style='padding:4px'><a href='https://example.com/track?id=1'>link</a></td>"
+               "<td>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</td></tr>")
+        padding = "<table>" + row * max(1, (pad_kb * 1024) // len(row)) + "</table>"
+    return (f"<html><head><style>p{{margin:0}}</style><script>var x=1;</script></head>"
+            f"<body><h1>{subject}</h1>{paragraphs}{padding}<img src='https://example.com/p.gif'/></body></html>")
+
+
+def build_payload(index, subject, body, large_html_every, large_html_kb):
+    """Cycle through the MIME shapes Gmail hands us in practice."""
+    pad_kb = large_html_kb if large_html_every and index % large_html_every == 0 else 0
+    html = _html_body(subject, body, pad_kb)
+    headers = [{"name": "Subject", "value": subject}, {"name": "From", "value": "sender@example.com"}]
+    html_part = {"mimeType": "text/html", "body": {"data": _b64(html)}}
+    if pad_kb:
+        # large newsletters are HTML-only, either top level or nested under multipart/mixed
+        shape = 1 if (index // large_html_every) % 2 == 0 else 3
+        alternative = {"mimeType": "multipart/alternative", "parts": [html_part]}
+    else:
+        shape = index % 4
+        alternative = {
+            "mimeType": "multipart/alternative",
+            "parts": [{"mimeType": "text/plain", "body": {"data": _b64(body)}}, html_part],
+        }
+    if shape == 0:
+        return {"mimeType": "text/plain", "headers": headers, "body": {"data": _b64(body)}}
+    if shape == 1:
+        return dict(html_part, headers=headers)
+    if shape == 2:
+        return dict(alternative, headers=headers)
+    return {
+        "mimeType": "multipart/mixed",
+        "headers": headers,
+        "parts": [
+            alternative,
+            {"mimeType": "application/pdf", "filename": "agenda.pdf", "body": {"attachmentId": f"att-{index}"}},
+        ],
+    }
+
+
+def load_rows(path=DATASET_PATH):
+    import pandas as pd
+    df = pd.read_csv(path, usecols=["subject", "body"]).fillna("")
+    return list(df.itertuples(index=False, name=None))
+
+
+def build_mailbox(rows, user_index, mails, large_html_every, large_html_kb):
+    messages = []
+    base_ms = int(time.time() * 1000)
+    for i in range(mails):
+        subject, body = rows[(user_index * mails + i) % len(rows)]
+        messages.append({
+            "id": f"u{user_index}-m{i}",
+            "threadId": f"u{user_index}-t{i}",
+            "internalDate": str(base_ms - i * 60000),
+            "labelIds": ["UNREAD", "INBOX"],
+            "payload": build_payload(i, subject, body, large_html_every, large_html_kb),
+        })
+    return messages
+
+
+# ---------------- Fake Google services ----------------
+class FakeCreds:
+    """Picklable stand-in for google.oauth2 Credentials."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.expired = False
+        self.refresh_token = None
+        self.token_response = {}
+
+
+class _Call:
+    def __init__(self, fn, latency, timer, stage):
+        self._fn = fn
+        self._latency = latency
+        self._timer = timer
+        self._stage = stage
+
+    def execute(self):
+        start = time.perf_counter()
+        if self._latency:
+            time.sleep(self._latency)
+        result = self._fn()
+        self._timer.record(self._stage, time.perf_counter() - start)
+        return result
+
+
+class FakeMailbox:
+    """
+    Serves one user's synthetic messages. A message stops being listed as
+    unread once it has been fetched in full, so repeated ticks drain the inbox.
+    """
+
+    def __init__(self, messages, latency, timer):
+        self._by_id = {m["id"]: m for m in messages}
+        self._unread = [m["id"] for m in messages]
+        self._latency = latency
+        self._timer = timer
+
+    @property
+    def remaining(self):
+        return len(self._unread)
+
+    def list(self, userId="me", q=None, maxResults=100, pageToken=None):
+        def run():
+            start = int(pageToken or 0)
+            ids = self._unread[start:start + maxResults]
+            resp = {"messages": [{"id": i, "threadId": self._by_id[i]["threadId"]} for i in ids]}
+            if start + maxResults < len(self._unread):
+                resp["nextPageToken"] = str(start + maxResults)
+            return resp
+        return _Call(run, self._latency, self._timer, "gmail_list")
+
+    def get(self, userId="me", id=None, format="full"):
+        def run():
+            if id in self._unread:
+                self._unread.remove(id)
+            return copy.deepcopy(self._by_id[id])
+        return _Call(run, self._latency, self._timer, "gmail_get")
+
+
+class FakeGmailService:
+    def __init__(self, mailbox):
+        self._mailbox = mailbox
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self._mailbox
+
+    def getProfile(self, userId="me"):
+        return _Call(lambda: {"emailAddress": "bench@example.com"}, 0, StageTimer(), "gmail_profile")
+
+
+class FakeCalendarService:
+    def __init__(self, latency, timer):
+        self._latency = latency
+        self._timer = timer
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId="primary", body=None):
+        link = f"https://calendar.example.com/event?summary={body.get('summary', '')[:32]}"
+        return _Call(lambda: {"htmlLink": link}, self._latency, self._timer, "calendar_insert")
+
+
+def make_fake_build(mailboxes, calendar_latency, timer):
+    def build(service_name, version, credentials=None, **kwargs):
+        if service_name == "gmail":
+            return FakeGmailService(mailboxes[credentials.user_id])
+        if service_name == "calendar":
+            return FakeCalendarService(calendar_latency, timer)
+        raise ValueError(f"fake build: unsupported service {service_name}")
+    return build
+
+
+# ---------------- Stub Gemini ----------------
+_DATE_RE = re.compile(r"\b(\d{1,2}) (January|February|March|April|May|June|July|August|September|October|November|December) (\d{4})\b")
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGenerativeModel:
+    """Mimics GenerativeModel.generate_content with a fixed per-call latency."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.prompt_chars = 0
+
+    def generate_content(self, prompt):
+        self.prompt_chars += len(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        if prompt.lstrip().startswith("Extract an EVENT"):
+            match = _DATE_RE.search(prompt)
+            if not match:
+                return _StubResponse("{}")
+            date = datetime.datetime.strptime(" ".join(match.groups()), "%d %B %Y").strftime("%Y-%m-%d")
+            return _StubResponse(json.dumps({
+                "title": "Benchmark event",
+                "date": date,
+                "start_time": "10:00",
+                "end_time": "11:00",
+                "location": "Online",
+                "description": "",
+            }))
+        body = prompt.split('"""', 1)[-1]
+        return _StubResponse(" ".join(body.split()[:40]))
+
+
+# ---------------- Harness ----------------
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def install_fakes(args, timer, mailboxes, stub_model):
+    """Import the app with offline fakes swapped in. Returns the main module."""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    if args.mongo_uri:
+        os.environ["mongo_uri"] = args.mongo_uri
+    os.environ.setdefault("mongo_uri", "mongodb://localhost:27017")
+    os.environ.setdefault("METRICS_LOG_SAMPLE_RATE", "0")  # keep the report readable
+    import main
+    import calender
+    import database
+    import metrics
+    from MAILFETCHING import fetch
+    from models import primarymodel, secondarymodel
+
+    fake_build = make_fake_build(mailboxes, args.calendar_latency_ms / 1000.0, timer)
+    fetch.build = fake_build
+    calender.build = fake_build
+    secondarymodel.model = stub_model
+
+    if not args.mongo_uri:
+        database.set_client(MemoryClient())
+
+    timer.wrap(fetch, "get_unread_emails", "fetch")
+    timer.wrap(fetch, "clean_full_text", "html_clean")
+    timer.wrap(primarymodel, "classify_emails", "classify")
+    timer.wrap(secondarymodel, "compact_for_prompt", "llm_compaction")
+    timer.wrap(secondarymodel, "extract_event", "llm_extract")
+    timer.wrap(secondarymodel, "summarize_email", "llm_summarize")
+    timer.wrap(main, "process_emails_for_user", "tick_per_user")
+
+    # metrics.timed() reports through metrics.observe; copy the inline stages into the report
+    observe = metrics.observe
+
+    def observe_and_record(stage, seconds):
+        observe(stage, seconds)
+        if stage in METRICS_STAGES:
+            timer.record(stage, seconds)
+
+    metrics.observe = observe_and_record
+    return main
+
+
+def run(args):
+    os.chdir(REPO_ROOT)  # model pickles are loaded relative to the repo root
+    random.seed(args.seed)
+    timer = StageTimer()
+    rows = load_rows()
+
+    user_ids = [f"bench_user_{u}" for u in range(args.users)]
+    mailboxes = {
+        uid: FakeMailbox(build_mailbox(rows, u, args.mails, args.large_html_every, args.large_html_kb),
+                         args.gmail_latency_ms / 1000.0, timer)
+        for u, uid in enumerate(user_ids)
+    }
+    stub_model = StubGenerativeModel(args.llm_latency_ms / 1000.0)
+    main = install_fakes(args, timer, mailboxes, stub_model)
+
+    user_docs = [{"user_id": uid, "creds_b64": base64.b64encode(pickle.dumps(FakeCreds(uid))).decode()}
+                 for uid in user_ids]
+
+    # pay one-off lazy imports and model loading before measuring steady-state throughput
+    from models import primarymodel
+    primarymodel.load_model_and_vectorizer()
+    import bs4  # noqa: F401
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    ticks = 0
+    while any(mb.remaining for mb in mailboxes.values()) and ticks < args.max_ticks:
+        ticks += 1
+        for user_doc in user_docs:
+            main.process_emails_for_user(user_doc, verbose=args.verbose)
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    import database
+    db = database.get_db()
+    processed = sum(db[uid].count_documents({"processed": True}) for uid in user_ids)
+    if args.mongo_uri:
+        for uid in user_ids:
+            db[uid].drop()
+            db[f"{uid}_events"].drop()
+
+    try:
+        import resource
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    except Exception:
+        max_rss_mb = None
+
+    return {
+        "meta": {
+            "label": args.label,
+            "git_commit": git_commit(),
+            "timestamp": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {
+                "users": args.users,
+                "mails": args.mails,
+                "gmail_latency_ms": args.gmail_latency_ms,
+                "llm_latency_ms": args.llm_latency_ms,
+                "calendar_latency_ms": args.calendar_latency_ms,
+                "large_html_every": args.large_html_every,
+                "large_html_kb": args.large_html_kb,
+                "mongo": "local" if args.mongo_uri else "memory",
+            },
+        },
+        "totals": {
+            "emails_expected": args.users * args.mails,
+            "emails_processed": processed,
+            "ticks": ticks,
+            "wall_s": round(wall, 3),
+            "emails_per_s": round(processed / wall, 3) if wall else 0.0,
+            "peak_traced_mb": round(peak / (1024.0 * 1024.0), 3),
+            "max_rss_mb": round(max_rss_mb, 3) if max_rss_mb else None,
+            "llm_prompt_chars": stub_model.prompt_chars,
+        },
+        "stages": timer.summary(),
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print per-stage p50/p90 deltas against a previous result; return True on regression."""
+    regressed = False
+    print(f"\nComparison against {baseline['meta'].get('label') or baseline['meta'].get('git_commit')}:")
+    old_eps = baseline["totals"].get("emails_per_s") or 0.0
+    new_eps = current["totals"].get("emails_per_s") or 0.0
+    if old_eps:
+        change = (new_eps - old_eps) / old_eps
+        flag = "  <-- REGRESSION" if change < -threshold else ""
+        regressed |= bool(flag)
+        print(f"  emails/s: {old_eps:.2f} -> {new_eps:.2f} ({change:+.1%}){flag}")
+    for stage, stats in current["stages"].items():
+        old = baseline["stages"].get(stage)
+        if not old:
+            continue
+        for key in ("p50_ms", "p90_ms"):
+            if not old[key]:
+                continue
+            change = (stats[key] - old[key]) / old[key]
+            flag = "  <-- REGRESSION" if change > threshold else ""
+            regressed |= bool(flag)
+            print(f"  {stage:<16} {key}: {old[key]:.3f} -> {stats[key]:.3f} ({change:+.1%}){flag}")
+    return regressed
+
+
+def print_report(result):
+    totals = result["totals"]
+    print(f"\n{totals['emails_processed']}/{totals['emails_expected']} emails in {totals['wall_s']}s "
+          f"({totals['emails_per_s']} emails/s, {totals['ticks']} ticks)")
+    print(f"peak traced memory: {totals['peak_traced_mb']} MB, max RSS: {totals['max_rss_mb']} MB")
+    print(f"\n{'stage':<16}{'count':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+    for stage, s in result["stages"].items():
+        print(f"{stage:<16}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}"
+              f"{s['p90_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline benchmark for the MailMind email pipeline.")
+    p.add_argument("--users", type=int, default=4, help="number of simulated users (N)")
+    p.add_argument("--mails", type=int, default=50, help="unread mails per user (M)")
+    p.add_argument("--gmail-latency-ms", type=float, default=0.0, help="simulated latency per Gmail API call")
+    p.add_argument("--llm-latency-ms", type=float, default=50.0, help="simulated latency per Gemini call")
+    p.add_argument("--calendar-latency-ms", type=float, default=0.0, help="simulated latency per Calendar insert")
+    p.add_argument("--large-html-every", type=int, default=10, help="every Nth mail carries a large HTML body (0 = never)")
+    p.add_argument("--large-html-kb", type=int, default=256, help="approximate size of the large HTML bodies")
+    p.add_argument("--mongo-uri", default=None, help="use a local Mongo instead of the in-memory store")
+    p.add_argument("--max-ticks", type=int, default=1000, help="safety cap on scheduler ticks")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--label", default=None, help="free-form label stored with the results (e.g. a version)")
+    p.add_argument("--output", default=None, help="where to write the JSON results")
+    p.add_argument("--baseline", default=None, help="previous results JSON to compare against")
+    p.add_argument("--threshold", type=float, default=0.10, help="relative change treated as a regression")
+    p.add_argument("--verbose", action="store_true")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run(args)
+    print_report(result)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"pipeline-{result['meta']['git_commit'] or 'local'}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\n[INFO] Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
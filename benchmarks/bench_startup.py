@@ -0,0 +1,108 @@
+# bench_startup.py
+"""
+Cold-start benchmark for the web process.
+
+Each run starts a fresh interpreter, imports main.py and serves a first
+request to `/` through Flask's test client, without touching Mongo, Gmail or
+Gemini. The run fails if the median import time or time to first response is
+over budget, or if any heavy ML/LLM/API module was imported along the way.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_startup --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# must not be imported just to serve `/`; they are loaded on first use
+HEAVY_MODULES = (
+    "pandas",
+    "sklearn",
+    "google.generativeai",
+    "googleapiclient",
+    "google_auth_oauthlib",
+    "bs4",
+    "pymongo",
+)
+
+CHILD = r"""
+import sys, time, json
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+resp = main.app.test_client().get("/")
+t2 = time.perf_counter()
+heavy = [m for m in json.loads(sys.argv[1]) if m in sys.modules]
+print(json.dumps({
+    "status": resp.status_code,
+    "import_ms": (t1 - t0) * 1000.0,
+    "first_response_ms": (t2 - t0) * 1000.0,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def run_once():
+    env = dict(os.environ)
+    env.setdefault("mongo_uri", "mongodb://localhost:27017")  # never contacted: the client is lazy
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD, json.dumps(HEAVY_MODULES)],
+                         cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=120)
+    spawn_ms = (time.perf_counter() - start) * 1000.0
+    if out.returncode != 0:
+        raise RuntimeError(f"startup run failed:\n{out.stderr}")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["spawn_to_response_ms"] = spawn_ms
+    return result
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Cold-start benchmark for the MailMind web process.")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--import-budget-ms", type=float, default=500.0, help="median budget for `import main`")
+    p.add_argument("--first-response-budget-ms", type=float, default=750.0,
+                   help="median budget from the start of `import main` to the first `/` response")
+    p.add_argument("--output", default=None, help="optional path for JSON results")
+    args = p.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+    summary = {}
+    for key in ("import_ms", "first_response_ms", "spawn_to_response_ms"):
+        values = [r[key] for r in runs]
+        summary[key] = {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+    heavy = sorted({m for r in runs for m in r["heavy_modules"]})
+    statuses = sorted({r["status"] for r in runs})
+
+    print(f"{'metric':<24}{'median':>10}{'max':>10}  (ms, {args.runs} runs)")
+    for key, s in summary.items():
+        print(f"{key:<24}{s['median']:>10.1f}{s['max']:>10.1f}")
+
+    failures = []
+    if summary["import_ms"]["median"] > args.import_budget_ms:
+        failures.append(f"import_ms {summary['import_ms']['median']} > budget {args.import_budget_ms}")
+    if summary["first_response_ms"]["median"] > args.first_response_budget_ms:
+        failures.append(f"first_response_ms {summary['first_response_ms']['median']} > budget {args.first_response_budget_ms}")
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if statuses != [200]:
+        failures.append(f"unexpected status codes for /: {statuses}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": runs, "summary": summary, "failures": failures}, f, indent=2)
+
+    for failure in failures:
+        print(f"[FAIL] {failure}")
+    if not failures:
+        print("[OK] startup within budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,10 @@
-from googleapiclient.discovery import build
 from datetime import datetime, timedelta
 
+def build(*args, **kwargs):
+    """googleapiclient.discovery.build, imported on first use (it is slow to import)."""
+    from googleapiclient.discovery import build as discovery_build
+    return discovery_build(*args, **kwargs)
+
 def add_events_to_calendar(creds, event):
     """
     Adds an event to Google Calendar.
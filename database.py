@@ -0,0 +1,42 @@
+# database.py
+"""
+One MongoClient shared by the whole process, created on first use.
+
+pymongo starts background monitor threads as soon as a client is built, so
+the web tier only pays for that when a request or job actually touches Mongo.
+"""
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from pymongo import MongoClient
+                _client = MongoClient(os.getenv("mongo_uri"))
+    return _client
+
+
+def set_client(client) -> None:
+    """Swap in another client (e.g. an in-memory one for benchmarks)."""
+    global _client
+    with _lock:
+        _client = client
+
+
+def get_db(name: str = "Emails"):
+    return get_client()[name]
+
+
+def get_tokens_collection():
+    # docs with keys: user_id, email, creds_b64, updated_at
+    return get_client()["gmail_auth"]["tokens"]
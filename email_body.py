@@ -0,0 +1,49 @@
+# email_body.py
+"""
+Storage format for email bodies.
+
+The full cleaned body is stored zlib-compressed in `body_z`, next to a short
+plain-text `preview` for list views. Only the classifier, the LLM calls and
+the detail view decompress it. Documents written before this format keep a
+plain `body` field, which load_body() and make_preview() still handle.
+"""
+import zlib
+
+PREVIEW_CHARS = 200
+CODEC = "zlib"
+COMPRESSION_LEVEL = 6
+
+
+def make_preview(body: str, limit: int = PREVIEW_CHARS) -> str:
+    body = (body or "").strip()
+    if len(body) <= limit:
+        return body
+    cut = body.rfind(" ", 0, limit)
+    return body[:cut if cut > limit // 2 else limit].rstrip() + "…"
+
+
+def pack_body(body: str) -> dict:
+    """Fields to store on an email doc in place of a plain `body`."""
+    body = body or ""
+    return {
+        "body_z": zlib.compress(body.encode("utf-8"), COMPRESSION_LEVEL),
+        "body_codec": CODEC,
+        "preview": make_preview(body),
+    }
+
+
+def load_body(doc: dict, default: str = "") -> str:
+    """Return the full body of an email doc, decompressing it if needed."""
+    data = doc.get("body_z")
+    if data is not None:
+        codec = doc.get("body_codec", CODEC)
+        if codec != CODEC:
+            raise ValueError(f"unsupported body codec: {codec}")
+        return zlib.decompress(bytes(data)).decode("utf-8")
+    return doc.get("body", default)
+
+
+def preview_of(doc: dict, default: str = "") -> str:
+    if "preview" in doc:
+        return doc["preview"]
+    return make_preview(doc.get("body", default))
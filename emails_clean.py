@@ -1,10 +1,17 @@
-from pymongo import MongoClient
 import datetime
+import database
 
-db_client = MongoClient("your_mongo_uri")
-db = db_client['Emails']
+# Off: this job never ran before (it pointed at a placeholder URI), and turning it on
+# is unsafe. fetch.get_unread_emails never marks mail read and dedupes only on the
+# msg_id docs deleted here, so still-unread mail would be fetched, sent to Gemini and
+# added to the calendar again every 24h. Enable it only together with a persistent
+# seen-msg_id record (or marking mail read).
+CLEANUP_ENABLED = False
 
 def cleanup_old_emails():
+    if not CLEANUP_ENABLED:
+        return
+    db = database.get_db()
     cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=24)
     for col_name in db.list_collection_names():
         if "_events" in col_name:
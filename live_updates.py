@@ -0,0 +1,53 @@
+# live_updates.py
+"""
+In-process pub/sub used to push freshly processed emails to open dashboards.
+
+process_emails_for_user publishes one message per processed email and the
+/dashboard/stream route forwards it to the browser as a server-sent event.
+Subscribers only see messages published in the same process; deployments
+where background processing runs in another process should rely on Mongo
+change streams instead (see main.dashboard_stream).
+"""
+import queue
+import threading
+
+MAX_PENDING = 100  # per subscriber; a stalled browser drops updates instead of growing memory
+
+_lock = threading.Lock()
+_subscribers = {}  # user_id -> set of queue.Queue
+
+
+def subscribe(user_id: str) -> queue.Queue:
+    q = queue.Queue(maxsize=MAX_PENDING)
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(q)
+    return q
+
+
+def unsubscribe(user_id: str, q: queue.Queue) -> None:
+    with _lock:
+        subs = _subscribers.get(user_id)
+        if not subs:
+            return
+        subs.discard(q)
+        if not subs:
+            del _subscribers[user_id]
+
+
+def has_subscribers(user_id: str) -> bool:
+    with _lock:
+        return bool(_subscribers.get(user_id))
+
+
+def publish(user_id: str, message: dict) -> int:
+    """Deliver message to every subscriber of user_id. Returns how many received it."""
+    with _lock:
+        subs = list(_subscribers.get(user_id, ()))
+    delivered = 0
+    for q in subs:
+        try:
+            q.put_nowait(message)
+            delivered += 1
+        except queue.Full:
+            pass
+    return delivered
@@ -1,16 +1,21 @@
 import os
+import json
+import time
+import queue
 import base64
 import pickle
 import datetime
 from threading import Thread
-from flask import Flask, render_template, session, request, redirect, url_for, jsonify
-from flask_session import Session
-from pymongo import MongoClient
+from flask import Flask, Response, render_template, session, request, redirect, url_for, jsonify
 from apscheduler.schedulers.background import BackgroundScheduler
 from dotenv import load_dotenv
 from MAILFETCHING import fetch 
 from models import primarymodel, secondarymodel
 from emails_clean import cleanup_old_emails
+import metrics
+import database
+import email_body
+import live_updates
 
 load_dotenv()
 
@@ -20,12 +25,79 @@ app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret")
 
 
 # -------------------- Mongo --------------------
+# the client itself is created lazily by database.get_client() on first use
 mongo_uri = os.getenv("mongo_uri")
 if not mongo_uri:
     raise RuntimeError("mongo_uri not found in environment")
-Client = MongoClient(mongo_uri)
-db = Client["Emails"]
-tokens_coll = Client['gmail_auth']['tokens']  # stores docs with keys: user_id, email, creds_b64, updated_at
+
+# -------------------- Dashboard helpers --------------------
+# list views never read the compressed body (body_z); legacy docs still carry a plain body
+DASHBOARD_FIELDS = {
+    "msg_id": 1, "subject": 1, "preview": 1, "body": 1,
+    "spam": 1, "event": 1, "cal_link": 1, "summary": 1
+}
+
+def dashboard_cards(e):
+    """
+    Turn a stored email doc into the cards shown on the dashboard:
+    {'email': {...}, 'event': {...} or None, 'summary': {...} or None}.
+    Shared by /dashboard and the live update stream so both render the same fields.
+    """
+    subject = e.get("subject", "(No subject)")
+    cards = {
+        "id": e.get("msg_id") or str(e.get("_id")),
+        "email": {
+            "subject": subject,
+            "preview": email_body.preview_of(e, "(No body)"),
+            "spam": e.get("spam", False)
+        },
+        "event": None,
+        "summary": None
+    }
+
+    if "event" in e:
+        event = e["event"]
+        cards["event"] = {
+            "subject": subject,
+            "title": event.get("title", ""),
+            "date": event.get("date", ""),
+            "start_time": event.get("start_time", ""),
+            "end_time": event.get("end_time", ""),
+            "location": event.get("location", ""),
+            "description": event.get("description", ""),
+            "cal_link": e.get("cal_link")
+        }
+
+    if "summary" in e:
+        cards["summary"] = {
+            "subject": subject,
+            "summary": e["summary"]
+        }
+    return cards
+
+_change_streams_ok = None
+_change_streams_retry_at = 0.0
+CHANGE_STREAM_CHECK_RETRY = 60  # seconds to wait before asking Mongo again after a failed check
+
+def change_streams_available():
+    """
+    Change streams need a replica set (or mongos). A successful answer is
+    cached for the life of the process; a failed check falls back to the
+    in-process pub/sub and is retried after CHANGE_STREAM_CHECK_RETRY seconds.
+    """
+    global _change_streams_ok, _change_streams_retry_at
+    if _change_streams_ok is not None:
+        return _change_streams_ok
+    if time.monotonic() < _change_streams_retry_at:
+        return False
+    try:
+        hello = database.get_client().admin.command("hello")
+        _change_streams_ok = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        return _change_streams_ok
+    except Exception as e:
+        print(f"[WARN] Could not check for change stream support, retrying in {CHANGE_STREAM_CHECK_RETRY}s: {e}")
+        _change_streams_retry_at = time.monotonic() + CHANGE_STREAM_CHECK_RETRY
+        return False
 
 # -------------------- Background processing helpers --------------------
 def normalize_classification_output(preds):
@@ -68,6 +140,10 @@ def process_emails_for_user(user_doc, verbose=False):
     Fetch and process unread emails for a single user.
     user_doc must contain 'user_id' and 'creds_b64'.
     """
+    with metrics.timed("tick_user", user_id=user_doc.get("user_id")):
+        _process_emails_for_user(user_doc, verbose=verbose)
+
+def _process_emails_for_user(user_doc, verbose=False):
     try:
         user_id = user_doc.get("user_id")
         if not user_id:
@@ -81,7 +157,8 @@ def process_emails_for_user(user_doc, verbose=False):
 
         # load credentials
         try:
-            creds = pickle.loads(base64.b64decode(creds_b64.encode()))
+            with metrics.timed("creds_load", user_id=user_id):
+                creds = pickle.loads(base64.b64decode(creds_b64.encode()))
         except Exception as e:
             print(f"[ERROR] Failed to load creds for {user_id}: {e}")
             return
@@ -96,20 +173,26 @@ def process_emails_for_user(user_doc, verbose=False):
             return
 
         # get newly inserted docs (processed != True)
-        col = db[user_id]
-        new_docs = list(col.find({"processed": {"$ne": True}}))
+        col = database.get_db()[user_id]
+        with metrics.timed("mongo_read", user_id=user_id):
+            new_docs = list(col.find({"processed": {"$ne": True}}))
         if not new_docs:
             if verbose:
                 print(f"[INFO] No new docs to process for user {user_id}")
             return
 
+        # the classifier and LLM need the full text; decompress each body once
+        for d in new_docs:
+            d["body"] = email_body.load_body(d)
+
         # Build dataframe for classifier
         import pandas as pd
         df = pd.DataFrame([{"subject": d.get("subject", ""), "body": d.get("body", ""), "_id": d.get("_id")} for d in new_docs])
 
         # classify (robust)
         try:
-            preds_raw = primarymodel.classify_emails(df)
+            with metrics.timed("classify", user_id=user_id, emails=len(df)):
+                preds_raw = primarymodel.classify_emails(df)
         except Exception as e:
             print(f"[ERROR] primarymodel.classify_emails raised for {user_id}: {e}")
             preds_raw = []
@@ -131,11 +214,15 @@ def process_emails_for_user(user_doc, verbose=False):
 
             is_spam = (str(prediction).strip().lower() == "spam")
             upd = {"spam": is_spam, "processed": True}
+            metrics.inc("mailmind_emails_classified_total", result="spam" if is_spam else "ham")
 
             if not is_spam:
+                # compact once; both LLM calls below reuse it
+                prompt_body = secondarymodel.compact_for_prompt(doc.get("body", ""))
+
                 # attempt event extraction
                 try:
-                    event = secondarymodel.extract_event(doc.get("body", ""))
+                    event = secondarymodel.extract_event(prompt_body, compact=False)
                 except Exception as e:
                     print(f"[ERROR] extract_event failed for {user_id} doc {doc.get('_id')}: {e}")
                     event = None
@@ -150,14 +237,14 @@ def process_emails_for_user(user_doc, verbose=False):
                         print(f"[ERROR] Failed to add event for {user_id} doc {doc.get('_id')}: {e}")
                         # fallback: add summary instead
                         try:
-                            upd["summary"] = secondarymodel.summarize_email(doc.get("body", ""))
+                            upd["summary"] = secondarymodel.summarize_email(prompt_body, compact=False)
                         except Exception as e2:
                             print(f"[ERROR] Summarize fallback failed for {user_id} doc {doc.get('_id')}: {e2}")
                             upd["summary"] = "(summary failed)"
                 else:
                     # not an event -> summarize
                     try:
-                        upd["summary"] = secondarymodel.summarize_email(doc.get("body", ""))
+                        upd["summary"] = secondarymodel.summarize_email(prompt_body, compact=False)
                         if verbose: print(f"[INFO] Summarized email for {user_id} doc {doc.get('_id')}")
                     except Exception as e:
                         print(f"[ERROR] Summarization failed for {user_id} doc {doc.get('_id')}: {e}")
@@ -165,12 +252,20 @@ def process_emails_for_user(user_doc, verbose=False):
 
             # write update
             try:
-                col.update_one({"_id": doc["_id"]}, {"$set": upd})
+                with metrics.timed("mongo_write", user_id=user_id):
+                    col.update_one({"_id": doc["_id"]}, {"$set": upd})
             except Exception as e:
                 print(f"[ERROR] Failed to update doc {doc.get('_id')} for {user_id}: {e}")
+                continue
+
+            if live_updates.has_subscribers(user_id):
+                live_updates.publish(user_id, dashboard_cards({**doc, **upd}))
 
     except Exception as e:
         print(f"[ERROR] process_emails_for_user: {e}")
+        # swallowed here, so the tick_user timer in process_emails_for_user never sees it
+        metrics.inc("mailmind_stage_errors_total", stage="tick_user")
+        metrics.log_event("tick_user", force=True, outcome="error", error=str(e), user_id=user_doc.get("user_id"))
 
 def process_emails_background(verbose=False):
     """
@@ -179,11 +274,12 @@ def process_emails_background(verbose=False):
     if verbose:
         print("[INFO] Running background email processing...")
     try:
-        cursor = tokens_coll.find({}, {"user_id": 1, "creds_b64": 1})
-        for user_doc in cursor:
-            if not user_doc.get("user_id") or not user_doc.get("creds_b64"):
-                continue
-            process_emails_for_user(user_doc, verbose=verbose)
+        with metrics.timed("tick"):
+            cursor = database.get_tokens_collection().find({}, {"user_id": 1, "creds_b64": 1})
+            for user_doc in cursor:
+                if not user_doc.get("user_id") or not user_doc.get("creds_b64"):
+                    continue
+                process_emails_for_user(user_doc, verbose=verbose)
     except Exception as e:
         print(f"[ERROR] process_emails_background: {e}")
     if verbose:
@@ -250,41 +346,21 @@ def dashboard():
     page_size = 10
     skip = (page - 1) * page_size
 
-    emails_cursor = db[user_id].find().skip(skip).limit(page_size)
+    col = database.get_db()[user_id]
+    emails_cursor = col.find({}, DASHBOARD_FIELDS).skip(skip).limit(page_size)
     emails = list(emails_cursor)
 
     all_emails, event_emails, summary_emails = [], [], []
 
     for e in emails:
-        subject = e.get("subject", "(No subject)")
-        body = e.get("body", "(No body)")
+        cards = dashboard_cards(e)
+        all_emails.append(dict(cards["email"], id=cards["id"]))
+        if cards["event"]:
+            event_emails.append(dict(cards["event"], id=cards["id"]))
+        if cards["summary"]:
+            summary_emails.append(dict(cards["summary"], id=cards["id"]))
 
-        all_emails.append({
-            "subject": subject,
-            "body": body,
-            "spam": e.get("spam", False)
-        })
-
-        if "event" in e:
-            event = e["event"]
-            event_emails.append({
-                "subject": subject,
-                "title": event.get("title", ""),
-                "date": event.get("date", ""),
-                "start_time": event.get("start_time", ""),
-                "end_time": event.get("end_time", ""),
-                "location": event.get("location", ""),
-                "description": event.get("description", ""),
-                "cal_link": e.get("cal_link")
-            })
-
-        if "summary" in e:
-            summary_emails.append({
-                "subject": subject,
-                "summary": e["summary"]
-            })
-
-    next_page = page + 1 if db[user_id].count_documents({}) > skip + page_size else None
+    next_page = page + 1 if col.count_documents({}) > skip + page_size else None
 
     return render_template(
         "dashboard.html",
@@ -296,6 +372,75 @@ def dashboard():
         last_synced=datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
     )
 
+@app.route("/dashboard/stream")
+def dashboard_stream():
+    """
+    Server-sent events for the logged-in user's dashboard. Each processed
+    email is pushed as an 'email' event carrying dashboard_cards() JSON.
+    Uses Mongo change streams when the server is a replica set (so updates
+    made by other processes arrive too), otherwise the in-process pub/sub.
+    """
+    if 'user_id' not in session:
+        return jsonify({"status": "error", "message": "Not logged in"}), 403
+    user_id = session['user_id']
+    keepalive = 15  # seconds; stops proxies from closing an idle stream
+
+    def sse(cards):
+        return f"event: email\ndata: {json.dumps(cards, default=str)}\n\n"
+
+    def from_change_stream():
+        pipeline = [
+            {"$match": {
+                "operationType": "update",
+                "updateDescription.updatedFields.processed": True
+            }},
+            {"$project": {"fullDocument.body_z": 0}}
+        ]
+        with database.get_db()[user_id].watch(pipeline, full_document="updateLookup", max_await_time_ms=keepalive * 1000) as stream:
+            while stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if change.get("fullDocument"):
+                    yield sse(dashboard_cards(change["fullDocument"]))
+
+    def from_pubsub():
+        q = live_updates.subscribe(user_id)
+        try:
+            while True:
+                try:
+                    cards = q.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse(cards)
+        finally:
+            live_updates.unsubscribe(user_id, q)
+
+    source = from_change_stream if change_streams_available() else from_pubsub
+    return Response(source(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/email/<msg_id>")
+def email_detail(msg_id):
+    """Full body of one email, decompressed on demand for the dashboard detail view."""
+    if 'user_id' not in session:
+        return jsonify({"status": "error", "message": "Not logged in"}), 403
+
+    doc = database.get_db()[session['user_id']].find_one(
+        {"msg_id": msg_id}, {"subject": 1, "body": 1, "body_z": 1, "body_codec": 1}
+    )
+    if not doc:
+        return jsonify({"status": "error", "message": "Email not found"}), 404
+
+    return jsonify({
+        "status": "ok",
+        "msg_id": msg_id,
+        "subject": doc.get("subject", "(No subject)"),
+        "body": email_body.load_body(doc, "(No body)")
+    })
+
 @app.route("/manual-process")
 def manual_process():
     """Trigger background processing on demand — returns counts for debug."""
@@ -305,6 +450,11 @@ def manual_process():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape target with per-stage timings and counters."""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/logout")
 def logout():
     session.clear()
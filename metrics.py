@@ -0,0 +1,114 @@
+# metrics.py
+"""
+In-process timing histograms and counters for the email pipeline.
+
+Stages are timed with `timed("stage")`, exposed in Prometheus text format by
+render_prometheus() (served at /metrics) and logged as sampled JSON lines.
+Metrics are per process: with several gunicorn workers each worker reports
+its own numbers, so scrape every worker or run one.
+"""
+import os
+import json
+import time
+import random
+import threading
+import datetime
+from contextlib import contextmanager
+
+# seconds; covers fast Mongo calls up to slow LLM calls and whole ticks
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# fraction of successful stage timings written to the structured log; errors are always logged
+LOG_SAMPLE_RATE = float(os.getenv("METRICS_LOG_SAMPLE_RATE", "0.1"))
+
+_lock = threading.Lock()
+_histograms = {}  # stage -> {"buckets": [...], "sum": float, "count": int}
+_counters = {}    # (name, (label pairs)) -> value
+
+
+def observe(stage: str, seconds: float) -> None:
+    with _lock:
+        h = _histograms.get(stage)
+        if h is None:
+            h = _histograms[stage] = {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if seconds <= bound:
+                h["buckets"][i] += 1
+        h["sum"] += seconds
+        h["count"] += 1
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def log_event(stage: str, force: bool = False, **fields) -> None:
+    """Write one structured log line, subject to LOG_SAMPLE_RATE unless forced."""
+    if not force and random.random() >= LOG_SAMPLE_RATE:
+        return
+    record = {"ts": datetime.datetime.utcnow().isoformat() + "Z", "stage": stage}
+    record.update(fields)
+    print(json.dumps(record, default=str), flush=True)
+
+
+@contextmanager
+def timed(stage: str, **log_fields):
+    """
+    Time the enclosed block under `stage`. Exceptions are counted in
+    mailmind_stage_errors_total and re-raised unchanged.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        elapsed = time.perf_counter() - start
+        observe(stage, elapsed)
+        inc("mailmind_stage_errors_total", stage=stage)
+        log_event(stage, force=True, duration_ms=round(elapsed * 1000, 3), outcome="error", error=str(e), **log_fields)
+        raise
+    elapsed = time.perf_counter() - start
+    observe(stage, elapsed)
+    log_event(stage, duration_ms=round(elapsed * 1000, 3), outcome="ok", **log_fields)
+
+
+def _fmt_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    inner = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + inner + "}"
+
+
+def render_prometheus() -> str:
+    """Render all metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}
+                      for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    if histograms:
+        lines.append("# HELP mailmind_stage_duration_seconds Time spent in each pipeline stage.")
+        lines.append("# TYPE mailmind_stage_duration_seconds histogram")
+        for stage in sorted(histograms):
+            h = histograms[stage]
+            for bound, count in zip(DEFAULT_BUCKETS, h["buckets"]):
+                lines.append(f'mailmind_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'mailmind_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {h["count"]}')
+            lines.append(f'mailmind_stage_duration_seconds_sum{{stage="{stage}"}} {h["sum"]}')
+            lines.append(f'mailmind_stage_duration_seconds_count{{stage="{stage}"}} {h["count"]}')
+
+    names = sorted({name for name, _ in counters})
+    for name in names:
+        lines.append(f"# TYPE {name} counter")
+        for (n, pairs), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{name}{_fmt_labels(pairs)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
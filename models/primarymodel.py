@@ -1,15 +1,22 @@
 # primarymodel.py
 
 import os
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
 import pickle
+import threading
+
+# pandas and scikit-learn are imported inside the functions that need them so
+# importing this module (and the web app) stays fast.
 
 MODEL_PATH = "spam_classifier_model.pkl"
 VECTORIZER_PATH = "vectorizer.pkl"
 
+_loaded = None  # (model, vectorizer), loaded once per process
+_load_lock = threading.Lock()
+
 def train_model():
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
     print("[INFO] Training model from dataset...")
     df = pd.read_csv('datapreprocessing/processeddataset/processed.csv')
     df['comt'] = df['body'] + ' ' + df['subject']
@@ -26,15 +33,21 @@ def train_model():
     print("[INFO] Training complete. Model saved.")
 
 def load_model_and_vectorizer():
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(VECTORIZER_PATH):
-        train_model()
-    with open(MODEL_PATH, 'rb') as model_file:
-        model = pickle.load(model_file)
-    with open(VECTORIZER_PATH, 'rb') as vec_file:
-        vectorizer = pickle.load(vec_file)
-    return model, vectorizer
+    global _loaded
+    if _loaded is None:
+        with _load_lock:
+            if _loaded is None:
+                if not os.path.exists(MODEL_PATH) or not os.path.exists(VECTORIZER_PATH):
+                    train_model()
+                with open(MODEL_PATH, 'rb') as model_file:
+                    model = pickle.load(model_file)
+                with open(VECTORIZER_PATH, 'rb') as vec_file:
+                    vectorizer = pickle.load(vec_file)
+                _loaded = (model, vectorizer)
+    return _loaded
 
 def classify_emails(useremails):
+    import pandas as pd
     model, vectorizer = load_model_and_vectorizer()
     test_df = pd.DataFrame(useremails)
     if test_df.empty:
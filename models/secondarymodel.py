@@ -1,26 +1,204 @@
-import google.generativeai as genai
-import json, re, datetime
-from pymongo import MongoClient
+import json, re, math, datetime
+import threading
 from calender import add_events_to_calendar
 import os
 from dotenv import load_dotenv
+import metrics
+import database
 
 # Load env
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Gemini model, created ONCE on first use by get_model()
+# (google.generativeai is slow to import, so the web process defers it)
+model = None
+_model_lock = threading.Lock()
 
-# MongoDB setup
-db_client = MongoClient(os.getenv("mongo_uri"))
-db = db_client['Emails']
 
-# Create model instance ONCE
-model = genai.GenerativeModel("models/gemini-2.0-flash-001")
+def get_model():
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                model = genai.GenerativeModel("models/gemini-2.0-flash-001")
+    return model
 
 
-def extract_event(email_body):
+# ---------------- Prompt compaction ----------------
+# Upper bound on email tokens pasted into a prompt; prompt size drives Gemini latency and cost.
+LLM_BODY_TOKEN_BUDGET = int(os.getenv("LLM_BODY_TOKEN_BUDGET", "1500"))
+CHARS_PER_TOKEN = 4  # rough average for English text; avoids a count_tokens round trip
+
+# everything from a reply header onwards is quoted history
+_QUOTE_START = re.compile(
+    r"((?-i:\bOn)\s[^\n]{0,120}?\d[^\n]{0,120}?\swrote:"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|\bFrom:\s[^\n]{0,200}?\sSent:\s)",
+    re.IGNORECASE,
+)
+_QUOTE_KEYWORDS = ("wrote:", "original message", "sent:")
+# legal footers run to the end of the mail; only trusted in the second half of the text
+_FOOTER_START = re.compile(
+    r"(CONFIDENTIALITY NOTICE|DISCLAIMER:"
+    r"|This (?:e-?mail|message) and any (?:attachments|files)"
+    r"|This (?:e-?mail|message) (?:is|may be) (?:confidential|privileged|intended solely))",
+    re.IGNORECASE,
+)
+_FOOTER_KEYWORDS = ("confidential", "disclaimer", "and any attachments", "and any files", "intended solely")
+# RFC 3676 signature delimiter ("-- " on its own line); only trusted in the second half
+_SIGNATURE = re.compile(r"^-- $", re.MULTILINE)
+# stored bodies are flattened by fetch.clean_full_text, which turns the delimiter into
+# " -- "; that is only trusted in the second half with a signature-sized tail after it
+_FLAT_SIGNATURE = re.compile(r" -- ")
+_SIGNATURE_MAX_CHARS = 300
+# "> " quote markers left inline once newlines are gone
+_FLAT_QUOTE_MARKER = re.compile(r"(?:^|(?<=\s))>+(?=\s|$)")
+# these words also turn up in real content, so only short sentences in the second half
+# of the mail that carry no event hint are dropped
+_BOILERPLATE_MAX_CHARS = 200
+_BOILERPLATE = re.compile(
+    r"(unsubscribe|view (?:this email |it )?in (?:your |a )?browser|manage (?:your )?(?:email )?preferences"
+    r"|update your preferences|no longer wish to receive|you are receiving this|you received this"
+    r"|all rights reserved|privacy policy|sent from my (?:iphone|ipad|android|mobile|phone|galaxy))",
+    re.IGNORECASE,
+)
+# sentences most likely to carry an event's date, time or place
+_EVENT_HINTS = re.compile(
+    r"(\b\d{1,2}:\d{2}\b|\b\d{1,2}\s?(?:am|pm)\b|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b"
+    r"|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}\b"
+    r"|\b\d{1,2}(?:st|nd|rd|th)?\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\b"
+    r"|\b(?:mon|tues|wednes|thurs|fri|satur|sun)day\b|\b(?:today|tomorrow|tonight|next week)\b"
+    r"|\b(?:venue|location|room|hall|auditorium|campus|office|address|zoom|google meet|teams)\b"
+    r"|\b(?:meeting|webinar|event|workshop|seminar|interview|deadline|schedule[d]?|rsvp|invite|invitation)\b)",
+    re.IGNORECASE,
+)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_LEAD_SENTENCES = 2  # always kept for context
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def _iter_sentences(text):
+    """Yield (offset, sentence) pairs."""
+    pos = 0
+    for sep in _SENTENCE_SPLIT.finditer(text):
+        yield pos, text[pos:sep.start()]
+        pos = sep.end()
+    yield pos, text[pos:]
+
+
+def _is_boilerplate(sentence, offset, text_len):
+    return (
+        offset >= text_len // 2
+        and len(sentence) <= _BOILERPLATE_MAX_CHARS
+        and _BOILERPLATE.search(sentence) is not None
+        and not _EVENT_HINTS.search(sentence)
+    )
+
+
+def compact_email_body(email_body, token_budget=None):
+    """
+    Shrink an email body before it is pasted into a prompt: drop quoted reply
+    history, legal footers, unsubscribe/signature boilerplate and repeated
+    sentences, then trim to token_budget keeping the opening sentences and
+    those that look like they hold a date, time or place.
+    Returns (compacted_text, stats) where stats has tokens_before/after/saved.
+    """
+    text = email_body or ""
+    budget = LLM_BODY_TOKEN_BUDGET if token_budget is None else token_budget
+    tokens_before = estimate_tokens(text)
+
+    if "\n" in text:
+        # quoted lines ("> ...") and "-- " signatures, when line breaks survive
+        lines = [line for line in text.splitlines() if not line.lstrip().startswith(">")]
+        # a body that is all quote is kept, minus the markers
+        text = "\n".join(lines) if lines else _FLAT_QUOTE_MARKER.sub("", text)
+        signature = _SIGNATURE.search(text)
+        if signature and signature.start() > len(text) // 2:
+            text = text[:signature.start()]
+    else:
+        # flattened body: where a quote ends can't be told any more, so keep the
+        # text and drop only the markers
+        text = _FLAT_QUOTE_MARKER.sub("", text).strip()
+        for signature in _FLAT_SIGNATURE.finditer(text):
+            if signature.start() > len(text) // 2 and len(text) - signature.end() <= _SIGNATURE_MAX_CHARS:
+                text = text[:signature.start()]
+                break
+
+    # the regexes are slow on large bodies; a substring check rules most mails out first
+    lower = text.lower()
+    if any(k in lower for k in _QUOTE_KEYWORDS):
+        quote = _QUOTE_START.search(text)
+        if quote and quote.start() > 0:
+            text = text[:quote.start()]
+            lower = text.lower()
+    if any(k in lower for k in _FOOTER_KEYWORDS):
+        footer = _FOOTER_START.search(text)
+        if footer and footer.start() > len(text) // 2:
+            text = text[:footer.start()]
+
+    sentences, seen = [], set()
+    for offset, sentence in _iter_sentences(text):
+        sentence = sentence.strip()
+        key = " ".join(sentence.lower().split())
+        if not key or key in seen or _is_boilerplate(sentence, offset, len(text)):
+            continue
+        seen.add(key)
+        sentences.append(sentence)
+
+    if estimate_tokens(" ".join(sentences)) > budget:
+        ranked = sorted(
+            range(len(sentences)),
+            key=lambda i: (i >= _LEAD_SENTENCES, not _EVENT_HINTS.search(sentences[i]), i),
+        )
+        keep, used = set(), 0
+        for i in ranked:
+            cost = estimate_tokens(sentences[i]) + 1
+            if used + cost > budget:
+                continue
+            keep.add(i)
+            used += cost
+        sentences = [sentences[i] for i in sorted(keep)]
+
+    compacted = " ".join(sentences)
+    if estimate_tokens(compacted) > budget:
+        # a single huge sentence (e.g. flattened HTML) — hard cut
+        compacted = compacted[:budget * CHARS_PER_TOKEN]
+    if not compacted and email_body:
+        compacted = email_body[:budget * CHARS_PER_TOKEN]
+
+    tokens_after = estimate_tokens(compacted)
+    return compacted, {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": max(0, tokens_before - tokens_after),
+    }
+
+
+def compact_for_prompt(email_body):
+    """
+    compact_email_body() plus token accounting. Call it once per email and pass
+    the result to extract_event/summarize_email with compact=False, so the work
+    and the saved-token counters aren't repeated for each LLM call.
+    """
+    if isinstance(email_body, tuple):
+        email_body = email_body[0]
+    compacted, stats = compact_email_body(email_body)
+    metrics.inc("mailmind_llm_body_tokens_total", stats["tokens_after"])
+    metrics.inc("mailmind_llm_body_tokens_saved_total", stats["tokens_saved"])
+    metrics.log_event("llm_compaction", **stats)
+    return compacted
+
+
+def extract_event(email_body, compact=True):
     if isinstance(email_body, tuple):
         email_body = email_body[0]
+    if compact:
+        email_body = compact_for_prompt(email_body)
 
     prompt = f"""
 Extract an EVENT from this email if any exists.
@@ -30,7 +208,8 @@ Email:
 \"\"\"{email_body}\"\"\""""
 
     try:
-        response = model.generate_content(prompt)
+        with metrics.timed("llm_extract", prompt_chars=len(prompt)):
+            response = get_model().generate_content(prompt)
         text = response.text.strip()
 
         match = re.search(r'({.*})', text, re.DOTALL)
@@ -54,14 +233,17 @@ Email:
         return None
 
 
-def summarize_email(email_body):
+def summarize_email(email_body, compact=True):
     if isinstance(email_body, tuple):
         email_body = email_body[0]
+    if compact:
+        email_body = compact_for_prompt(email_body)
 
     prompt = f"Summarize the following email in 2-3 concise sentences:\n\"\"\"{email_body}\"\"\""
 
     try:
-        response = model.generate_content(prompt)
+        with metrics.timed("llm_summarize", prompt_chars=len(prompt)):
+            response = get_model().generate_content(prompt)
         return response.text.strip()
     except Exception as e:
         print(f"[ERROR summarize_email]: {e}")
@@ -69,18 +251,22 @@ def summarize_email(email_body):
 
 
 def cache_and_add_event(user_id, email_id, creds, event_details):
-    events_collection = db[f"{user_id}_events"]
+    events_collection = database.get_db()[f"{user_id}_events"]
 
-    existing = events_collection.find_one({"email_id": email_id})
+    with metrics.timed("mongo_read", user_id=user_id):
+        existing = events_collection.find_one({"email_id": email_id})
     if not existing:
-        events_collection.insert_one({
-            "email_id": email_id,
-            **event_details,
-            "added_at": datetime.datetime.utcnow()
-        })
+        with metrics.timed("mongo_write", user_id=user_id):
+            events_collection.insert_one({
+                "email_id": email_id,
+                **event_details,
+                "added_at": datetime.datetime.utcnow()
+            })
 
     try:
-        cal_link = add_events_to_calendar(creds, event_details)
+        with metrics.timed("calendar_insert", user_id=user_id):
+            cal_link = add_events_to_calendar(creds, event_details)
+        metrics.inc("mailmind_events_added_total")
         return cal_link
     except Exception as e:
         print(f"[ERROR adding to calendar]: {e}")
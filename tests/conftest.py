@@ -0,0 +1,5 @@
+import os
+import sys
+
+# modules live at the repo root (main.py, metrics.py, models/, MAILFETCHING/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,98 @@
+from MAILFETCHING.fetch import clean_full_text
+from models.secondarymodel import compact_email_body, estimate_tokens
+
+
+def compact(raw, **kwargs):
+    """Compact a body shaped like the stored ones, i.e. after clean_full_text flattened it."""
+    return compact_email_body(clean_full_text(raw), **kwargs)
+
+
+def test_boilerplate_words_in_event_sentence_are_kept():
+    body = "The privacy policy workshop is on 12 Oct at Hall B. Please RSVP."
+    compacted, _ = compact(body)
+    assert "12 Oct at Hall B" in compacted
+
+
+def test_trailing_boilerplate_is_dropped():
+    body = ("Hi all, the design review is on Friday at 10:30 in Room 4. Bring laptops. "
+            "Sent from my iPhone. Click here to unsubscribe.")
+    compacted, _ = compact(body)
+    assert "Room 4" in compacted
+    assert "iPhone" not in compacted
+    assert "unsubscribe" not in compacted
+
+
+def test_bare_double_dash_is_not_a_signature():
+    body = "Agenda:\n--\nItem 1 at 5pm in Hall B\nItem 2"
+    compacted, _ = compact(body)
+    assert "Item 1 at 5pm in Hall B" in compacted
+
+
+def test_rfc3676_signature_is_cut_near_the_end():
+    body = "Standup moves to 9:15 tomorrow in Room 2.\nThanks\n-- \nJane Doe\nHead of Ops"
+    compacted, _ = compact(body)
+    assert "9:15" in compacted
+    assert "Head of Ops" not in compacted
+
+
+def test_long_tail_after_dashes_is_not_a_signature():
+    body = "Notes. " + "Some context here. " * 3 + "Schedule -- " + "Talk at 5pm in Hall C. " * 20
+    compacted, _ = compact(body)
+    assert "Talk at 5pm in Hall C" in compacted
+
+
+def test_body_starting_with_quote_marker_is_kept():
+    body = "> Can we move the sync?\nSure, Thursday 3pm in Room 5 works."
+    compacted, _ = compact(body)
+    assert compacted == "Can we move the sync? Sure, Thursday 3pm in Room 5 works."
+    assert ">" not in compacted
+
+
+def test_unflattened_quoted_lines_are_dropped():
+    body = "Works for me, 3pm in Room 5.\n> Can we move the sync?\n> Thanks"
+    compacted, _ = compact_email_body(body)
+    assert compacted == "Works for me, 3pm in Room 5."
+
+
+def test_unflattened_body_of_only_quoted_lines_is_not_emptied():
+    body = "> Meeting moved to Friday 10:00 in Hall A.\n> See you there."
+    compacted, _ = compact_email_body(body)
+    assert "Friday 10:00 in Hall A" in compacted
+    assert ">" not in compacted
+
+
+def test_quoted_reply_history_is_removed():
+    body = ("Confirmed, see you there. "
+            "On Mon, 12 May 2025 at 09:00, Bob <bob@example.com> wrote: old meeting on 5 June 2025 at 3pm.")
+    compacted, _ = compact(body)
+    assert compacted == "Confirmed, see you there."
+
+
+def test_lowercase_on_is_not_a_reply_header():
+    body = "Please join the review on Friday, 16 May 2025 at 10:30. Tom wrote: the slides are ready."
+    compacted, _ = compact(body)
+    assert "16 May 2025" in compacted
+
+
+def test_legal_footer_only_cut_in_second_half():
+    body = "Agenda below. " + "Item text here. " * 30 + "CONFIDENTIALITY NOTICE: This message is private."
+    compacted, _ = compact(body)
+    assert "CONFIDENTIALITY" not in compacted
+
+    early = "CONFIDENTIALITY NOTICE: board meeting on 3 March at 10:00 in Hall A. " + "Details follow. " * 3
+    compacted, _ = compact(early)
+    assert "3 March" in compacted
+
+
+def test_budget_keeps_event_sentences_and_reports_savings():
+    filler = "".join(f"Filler sentence number {i} about nothing. " for i in range(300))
+    body = "Hello team. Quick note. " + filler + "The launch party is on 16 May 2025 at 18:00 in Hall B."
+    compacted, stats = compact(body, token_budget=60)
+    assert "16 May 2025 at 18:00 in Hall B" in compacted
+    assert estimate_tokens(compacted) <= 60
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"] > 0
+
+
+def test_repeated_sentences_are_deduplicated():
+    compacted, _ = compact("Reminder: exam on Monday. Reminder: exam on Monday. Good luck.")
+    assert compacted == "Reminder: exam on Monday. Good luck."
@@ -0,0 +1,64 @@
+import zlib
+
+import pytest
+
+from email_body import PREVIEW_CHARS, load_body, make_preview, pack_body, preview_of
+
+
+def test_pack_and_load_round_trip():
+    body = "Meeting on 12 Oct at Hall B. Café ☕ and naïve unicode survive. " * 50
+    doc = pack_body(body)
+    assert "body" not in doc
+    assert doc["body_codec"] == "zlib"
+    assert isinstance(doc["body_z"], bytes)
+    assert len(doc["body_z"]) < len(body.encode("utf-8"))
+    assert load_body(doc) == body
+
+
+def test_pack_empty_body():
+    doc = pack_body(None)
+    assert load_body(doc) == ""
+    assert doc["preview"] == ""
+
+
+def test_load_body_accepts_bson_binary_like_values():
+    # stored blobs may come back as bytes subclasses or other buffer types, not plain bytes
+    doc = {"body_z": bytearray(zlib.compress(b"hello")), "body_codec": "zlib"}
+    assert load_body(doc) == "hello"
+
+
+def test_load_body_rejects_unknown_codec():
+    with pytest.raises(ValueError):
+        load_body({"body_z": b"...", "body_codec": "zstd"})
+
+
+def test_legacy_plain_body_fallbacks():
+    legacy = {"body": "Old style body text."}
+    assert load_body(legacy) == "Old style body text."
+    assert preview_of(legacy) == "Old style body text."
+    assert load_body({}, "(No body)") == "(No body)"
+    assert preview_of({}, "(No body)") == "(No body)"
+
+
+def test_make_preview_short_text_unchanged():
+    assert make_preview("  Short note.  ") == "Short note."
+
+
+def test_make_preview_truncates_on_word_boundary():
+    body = "word " * 100
+    preview = make_preview(body)
+    assert preview.endswith("…")
+    assert len(preview) <= PREVIEW_CHARS + 1
+    assert not preview[:-1].endswith(" ")
+    assert body.startswith(preview[:-1])
+
+
+def test_make_preview_hard_cuts_text_without_spaces():
+    preview = make_preview("x" * 1000)
+    assert preview == "x" * PREVIEW_CHARS + "…"
+
+
+def test_stored_preview_wins_over_body():
+    doc = pack_body("Full body " * 100)
+    assert preview_of(doc) == doc["preview"]
+    assert len(doc["preview"]) <= PREVIEW_CHARS + 1